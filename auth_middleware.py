@@ -1,11 +1,17 @@
 from fastapi import Depends, HTTPException, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from passlib.context import CryptContext
+import jwt
+from jwt import InvalidTokenError
+from datetime import timedelta
 from database import get_database
 from models import UserResponse, UserRole
 from bson import ObjectId
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import bcrypt
+import hashlib
+import time
 import os
 
 
@@ -17,52 +23,77 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 COOKIE_NAME = "access_token"
 COOKIE_MAX_AGE = ACCESS_TOKEN_EXPIRE_MINUTES * 60 
 COOKIE_DOMAIN = os.getenv("COOKIE_DOMAIN", None)  
-COOKIE_SECURE = "true"  
+COOKIE_SECURE = True  
 COOKIE_SAMESITE = "none"  
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_COOKIE_KW = dict(
+    key=COOKIE_NAME,
+    path="/",
+    domain=COOKIE_DOMAIN,
+    secure=COOKIE_SECURE,
+    httponly=True,
+    samesite=COOKIE_SAMESITE
+)
+
+BCRYPT_ROUNDS = 12
+# bcrypt releases the GIL, so hashing on its own pool runs concurrent logins in parallel
+_PW_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="bcrypt")
+
 security = HTTPBearer(auto_error=False)  
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Decoded tokens -> (UserResponse, exp), so repeat requests skip jwt.decode and the users lookup
+_token_cache = TTLCache(maxsize=10_000, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+_token_cache_lock = asyncio.Lock()
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+async def invalidate_token(token: str):
+    """Drop a token from the decoded-token cache (e.g. on logout)"""
+    async with _token_cache_lock:
+        _token_cache.pop(_token_cache_key(token), None)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Check a password against its bcrypt hash on the password pool"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _PW_POOL,
+        bcrypt.checkpw,
+        plain_password.encode("utf-8"),
+        hashed_password.encode("utf-8")
+    )
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    """Hash a password with bcrypt on the password pool"""
+    hashed = await asyncio.get_running_loop().run_in_executor(
+        _PW_POOL,
+        bcrypt.hashpw,
+        password.encode("utf-8"),
+        bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    )
+    return hashed.decode("utf-8")
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time() + expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    to_encode["exp"] = expire
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def set_auth_cookie(response: Response, token: str):
     """Set authentication cookie in response"""
     response.set_cookie(
-        key=COOKIE_NAME,
         value=token,
         max_age=COOKIE_MAX_AGE,
         expires=COOKIE_MAX_AGE,
-        path="/",
-        domain=COOKIE_DOMAIN,
-        secure=COOKIE_SECURE,
-        httponly=True, 
-        samesite=COOKIE_SAMESITE
+        **_COOKIE_KW
     )
 
 def clear_auth_cookie(response: Response):
     """Clear authentication cookie"""
-    response.delete_cookie(
-        key=COOKIE_NAME,
-        path="/",
-        domain=COOKIE_DOMAIN,
-        secure=COOKIE_SECURE,
-        httponly=True,
-        samesite=COOKIE_SAMESITE
-    )
+    response.delete_cookie(**_COOKIE_KW)
 
 async def get_token_from_cookie_or_header(
     request: Request,
@@ -88,53 +119,68 @@ async def get_token_from_cookie_or_header(
 
 async def get_current_user(
     request: Request,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db = Depends(get_database)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> UserResponse:
+    db = get_database()
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    token = await get_token_from_cookie_or_header(request, credentials)
+    cache_key = _token_cache_key(token)
+    
+    async with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+    if cached is not None:
+        cached_user, exp = cached
+        if exp > time.time():
+            return cached_user
+    
     try:
-        token = await get_token_from_cookie_or_header(request, credentials)
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+    except InvalidTokenError:
         raise credentials_exception
     
     user = await db.users.find_one({"_id": ObjectId(user_id)})
     if user is None:
         raise credentials_exception
     
-    return UserResponse(**user)
+    user_response = UserResponse(**user)
+    async with _token_cache_lock:
+        _token_cache[cache_key] = (user_response, payload.get("exp", 0))
+    
+    return user_response
 
-async def get_current_manager(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
-    if current_user.role != UserRole.MANAGER:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only managers can access this resource"
-        )
-    return current_user
+def role_required(role: UserRole, detail: str | None = None):
+    """Build a dependency that resolves the current user and rejects any other role"""
+    if detail is None:
+        detail = f"Only {role.value}s can access this resource"
+    
+    async def check_role(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
+        if current_user.role != role:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail
+            )
+        return current_user
+    
+    return check_role
 
-async def get_current_employee(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
-    if current_user.role != UserRole.EMPLOYEE:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only employees can access this resource"
-        )
-    return current_user
+get_current_manager = role_required(UserRole.MANAGER)
+get_current_employee = role_required(UserRole.EMPLOYEE)
 
 async def get_current_user_optional(
     request: Request,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db = Depends(get_database)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> UserResponse | None:
     """Get current user without raising exception if not authenticated"""
     try:
-        return await get_current_user(request, credentials, db)
+        return await get_current_user(request, credentials)
     except HTTPException:
         return None
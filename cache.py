@@ -0,0 +1,84 @@
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from typing import Any, Optional
+import orjson
+import os
+import random
+import time
+
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL = 300
+# Entries are refreshed early with a probability that grows as they approach expiry (XFetch)
+EARLY_REFRESH_WINDOW = 0.2
+
+redis_client: Optional[aioredis.Redis] = None
+
+async def init_cache():
+    global redis_client
+    if not REDIS_URL:
+        print("REDIS_URL not set, response caching disabled")
+        return
+
+    redis_client = aioredis.from_url(REDIS_URL)
+    print("Cache connected successfully")
+
+async def close_cache():
+    if redis_client:
+        await redis_client.aclose()
+
+def forms_list_key(manager_id: str, active_only: bool) -> str:
+    return f"v1:forms:manager:{manager_id}:{'active' if active_only else 'all'}"
+
+def form_key(form_id) -> str:
+    return f"v1:form:{form_id}"
+
+async def cache_get(key: str) -> Any:
+    """Return a cached JSON value, or None on a miss, an early refresh, a corrupt entry or a Redis error"""
+    if redis_client is None:
+        return None
+
+    try:
+        raw = await redis_client.get(key)
+    except RedisError:
+        return None
+    if raw is None:
+        return None
+
+    try:
+        entry = orjson.loads(raw)
+        remaining = entry["expires_at"] - time.time()
+        value = entry["value"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        await cache_delete(key)
+        return None
+
+    if remaining < CACHE_TTL * EARLY_REFRESH_WINDOW * random.random():
+        return None
+
+    return value
+
+async def cache_set(key: str, value: Any, ttl: int = CACHE_TTL):
+    if redis_client is None:
+        return
+
+    entry = orjson.dumps({"value": value, "expires_at": time.time() + ttl})
+    try:
+        await redis_client.set(key, entry, ex=ttl)
+    except RedisError:
+        pass
+
+async def cache_delete(*keys: str):
+    if redis_client is None or not keys:
+        return
+
+    try:
+        await redis_client.delete(*keys)
+    except RedisError:
+        pass
+
+async def invalidate_forms(manager_id: str, form_id=None):
+    """Drop a manager's cached form lists, and the single form entry if given"""
+    keys = [forms_list_key(manager_id, True), forms_list_key(manager_id, False)]
+    if form_id is not None:
+        keys.append(form_key(form_id))
+    await cache_delete(*keys)
@@ -1,5 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from pymongo.server_api import ServerApi
+import asyncio
 import os
 from typing import Optional
 
@@ -18,15 +20,31 @@ async def init_db():
     print("Database connected successfully")
 
 async def create_indexes():
-    await database.users.create_index("email", unique=True)
-    await database.users.create_index("employee_id", unique=True)
-    
-    await database.feedback.create_index([("employee_id", 1), ("created_at", -1)])
-    await database.feedback.create_index("manager_id")
-    
-    await database.forms.create_index("manager_id")
+    """Create indexes matching the filter and sort shapes of the routers' queries"""
+    await asyncio.gather(
+        database.users.create_indexes([
+            IndexModel("email", unique=True),
+            IndexModel("employee_id", unique=True),
+            IndexModel([("manager_id", ASCENDING), ("role", ASCENDING), ("is_active", ASCENDING)])
+        ]),
+        
+        # Each list filter is followed by the (created_at, _id) keyset sort used for pagination
+        database.feedback.create_indexes([
+            IndexModel([("manager_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("employee_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("form_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("manager_id", ASCENDING), ("employee_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("manager_id", ASCENDING), ("form_id", ASCENDING)])
+        ]),
+        
+        database.forms.create_indexes([
+            IndexModel([("manager_id", ASCENDING), ("created_at", DESCENDING)]),
+            IndexModel([("manager_id", ASCENDING), ("is_active", ASCENDING), ("created_at", DESCENDING)])
+        ])
+    )
 
-async def get_database():
+def get_database():
+    """Return the database handle opened by init_db"""
     return database
 
 async def close_db():
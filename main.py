@@ -1,9 +1,12 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 import uvicorn
 from database import init_db
+from cache import init_cache, close_cache
 from routers import auth, feedback, dashboard, forms
 from auth_middleware import get_current_user
 
@@ -12,21 +15,36 @@ security = HTTPBearer()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await init_cache()
     yield
+    await close_cache()
 
 app = FastAPI(
     title="Feedback Management System",
     description="A comprehensive feedback management system for managers and employees",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+class RequestTimeMiddleware:
+    """Stamp each request with one naive UTC timestamp, matching what Motor reads back, as request.state.now"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["now"] = datetime.now(timezone.utc).replace(tzinfo=None)
+        await self.app(scope, receive, send)
+
+app.add_middleware(RequestTimeMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "https://feedback-1.netlify.app"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
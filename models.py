@@ -1,15 +1,24 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict, root_validator
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, model_validator
 from typing import Optional, List, Dict, Any, Annotated
 from datetime import datetime
 from enum import Enum
 from bson import ObjectId
+from bson.errors import InvalidId
 from pydantic_core import core_schema
 
 class PyObjectId(ObjectId):
+    _core_schema: Optional[core_schema.CoreSchema] = None
+
     @classmethod
     def __get_pydantic_core_schema__(
         cls, source_type: Any, handler
     ) -> core_schema.CoreSchema:
+        if cls._core_schema is None:
+            cls._core_schema = cls._build_core_schema()
+        return cls._core_schema
+
+    @classmethod
+    def _build_core_schema(cls) -> core_schema.CoreSchema:
         return core_schema.json_or_python_schema(
             json_schema=core_schema.str_schema(),
             python_schema=core_schema.union_schema([
@@ -19,26 +28,47 @@ class PyObjectId(ObjectId):
                     core_schema.no_info_plain_validator_function(cls.validate),
                 ])
             ]),
-            serialization=core_schema.plain_serializer_function_ser_schema(
-                lambda x: str(x)
-            ),
+            serialization=core_schema.to_string_ser_schema(when_used="always"),
         )
 
     @classmethod
     def validate(cls, v):
-        if not ObjectId.is_valid(v):
+        try:
+            return ObjectId(v)
+        except (InvalidId, TypeError):
             raise ValueError("Invalid objectid")
-        return ObjectId(v)
 
 class UserRole(str, Enum):
     MANAGER = "manager"
     EMPLOYEE = "employee"
 
+# Role values resolved once for query filters and role checks in the routers
+MANAGER_ROLE = UserRole.MANAGER.value
+EMPLOYEE_ROLE = UserRole.EMPLOYEE.value
+
 class SentimentType(str, Enum):
     POSITIVE = "positive"
     NEUTRAL = "neutral"
     NEGATIVE = "negative"
 
+_SENTIMENT_MAP = {
+    "positive": SentimentType.POSITIVE, "pos": SentimentType.POSITIVE,
+    "Positive": SentimentType.POSITIVE, "POSITIVE": SentimentType.POSITIVE,
+    "negative": SentimentType.NEGATIVE, "neg": SentimentType.NEGATIVE,
+    "Negative": SentimentType.NEGATIVE, "NEGATIVE": SentimentType.NEGATIVE,
+    "neutral": SentimentType.NEUTRAL, "Neutral": SentimentType.NEUTRAL, "NEUTRAL": SentimentType.NEUTRAL,
+}
+
+def normalize_sentiment(sentiment: Optional[str]) -> SentimentType:
+    """Map a stored sentiment spelling to its SentimentType member, defaulting to neutral"""
+    if not sentiment:
+        return SentimentType.NEUTRAL
+    
+    normalized = _SENTIMENT_MAP.get(sentiment)
+    if normalized is None:
+        normalized = _SENTIMENT_MAP.get(sentiment.lower(), SentimentType.NEUTRAL)
+    return normalized
+
 class FormFieldType(str, Enum):
     TEXT = "text"
     TEXTAREA = "textarea"
@@ -68,8 +98,7 @@ class UserCreate(UserBase):
 class UserResponse(UserBase):
     model_config = ConfigDict(
         populate_by_name=True,
-        arbitrary_types_allowed=True,
-        json_encoders={ObjectId: str}
+        arbitrary_types_allowed=True
     )
     
     id: Annotated[PyObjectId, Field(alias="_id")] = Field(default_factory=PyObjectId)
@@ -100,11 +129,17 @@ class FeedbackUpdate(BaseModel):
     additional_notes: Optional[str] = None
     form_data: Optional[Dict[str, Any]] = None
 
+# Upper bound on the entries a single batch request may write
+MAX_BATCH_SIZE = 500
+
+class FeedbackAcknowledgeBatch(BaseModel):
+    """Request model for acknowledging several feedback entries at once"""
+    ids: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
 class FeedbackResponse(FeedbackBase):
     model_config = ConfigDict(
         populate_by_name=True,
-        arbitrary_types_allowed=True,
-        json_encoders={ObjectId: str}
+        arbitrary_types_allowed=True
     )
     
     id: Annotated[PyObjectId, Field(alias="_id")] = Field(default_factory=PyObjectId)
@@ -124,8 +159,14 @@ class FormField(BaseModel):
     placeholder: Optional[str] = None
     name: Optional[str] = None  # New field
 
-    @root_validator(pre=True)
+    @model_validator(mode="before")
+    @classmethod
     def auto_generate_id_and_name(cls, values):
+        if not isinstance(values, dict):
+            return values
+        if values.get("id") and values.get("name"):
+            return values
+        
         label = values.get("label", "")
         if label:
             if not values.get("id"):
@@ -136,8 +177,10 @@ class FormField(BaseModel):
 
     @staticmethod
     def to_camel_case(label: str) -> str:
-        words = label.strip().split()
-        return words[0].lower() + ''.join(word.capitalize() for word in words[1:])
+        words = label.split()
+        if not words:
+            return ""
+        return "".join([words[0].lower(), *[word[:1].upper() + word[1:] for word in words[1:]]])
 
 class FeedbackFormBase(BaseModel):
     title: str
@@ -157,8 +200,7 @@ class FeedbackFormUpdate(BaseModel):
 class FeedbackFormResponse(FeedbackFormBase):
     model_config = ConfigDict(
         populate_by_name=True,
-        arbitrary_types_allowed=True,
-        json_encoders={ObjectId: str}
+        arbitrary_types_allowed=True
     )
     
     id: Annotated[PyObjectId, Field(alias="_id")] = Field(default_factory=PyObjectId)
@@ -3,41 +3,51 @@ from fastapi.security import HTTPBearer
 from typing import List
 from datetime import timedelta
 from database import get_database
-from models import UserCreate, UserLogin, UserResponse, Token, UserRole, ManagerResponse
+from models import UserCreate, UserLogin, UserResponse, Token, UserRole, ManagerResponse, MANAGER_ROLE, EMPLOYEE_ROLE
 from auth_middleware import (
     verify_password, 
     get_password_hash, 
     create_access_token, 
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_user,
+    role_required,
     set_auth_cookie,
-    clear_auth_cookie
+    clear_auth_cookie,
+    invalidate_token,
+    COOKIE_NAME
 )
-from datetime import datetime
+import asyncio
 
 router = APIRouter()
 security = HTTPBearer()
 
+require_manager = role_required(UserRole.MANAGER, "Only managers can view team members")
+
 @router.post("/register", response_model=UserResponse)
-async def register_user(user: UserCreate, db = Depends(get_database)):
-    existing_user = await db.users.find_one({"email": user.email})
+async def register_user(user: UserCreate, request: Request):
+    db = get_database()
+    
+    existing_user, existing_employee = await asyncio.gather(
+        db.users.find_one({"email": user.email}),
+        db.users.find_one({"employee_id": user.employee_id})
+    )
+    
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    existing_employee = await db.users.find_one({"employee_id": user.employee_id})
     if existing_employee:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Employee ID already exists"
         )
     
-    if user.role == UserRole.EMPLOYEE and user.manager_id:
+    if user.role == EMPLOYEE_ROLE and user.manager_id:
         manager = await db.users.find_one({
             "employee_id": user.manager_id,
-            "role": UserRole.MANAGER
+            "role": MANAGER_ROLE
         })
         if not manager:
             raise HTTPException(
@@ -45,25 +55,26 @@ async def register_user(user: UserCreate, db = Depends(get_database)):
                 detail="Invalid manager ID"
             )
     
-    user_dict = user.dict()
-    user_dict["password"] = get_password_hash(user.password)
-    user_dict["created_at"] = datetime.utcnow()
+    user_dict = user.model_dump(exclude={"password"})
+    user_dict["password"] = await get_password_hash(user.password)
+    user_dict["created_at"] = request.state.now
     user_dict["is_active"] = True
     
     result = await db.users.insert_one(user_dict)
-    created_user = await db.users.find_one({"_id": result.inserted_id})
+    created_user = {**user_dict, "_id": result.inserted_id}
     
     return UserResponse(**created_user)
 
 @router.post("/login")
 async def login_user(
     user_credentials: UserLogin, 
-    response: Response,
-    db = Depends(get_database)
+    response: Response
 ):
+    db = get_database()
+    
     user = await db.users.find_one({"email": user_credentials.email})
     
-    if not user or not verify_password(user_credentials.password, user["password"]):
+    if not user or not await verify_password(user_credentials.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -91,8 +102,15 @@ async def login_user(
     }
 
 @router.post("/logout")
-async def logout_user(response: Response):
+async def logout_user(request: Request, response: Response):
     """Logout user by clearing the authentication cookie"""
+    token = request.cookies.get(COOKIE_NAME)
+    if not token:
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials
+    if token:
+        await invalidate_token(token)
     clear_auth_cookie(response)
     return {"message": "Logout successful"}
 
@@ -106,29 +124,31 @@ async def get_current_user_info(
 @router.get("/team-members", response_model=List[UserResponse])
 async def get_team_members(
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    current_user: UserResponse = Depends(require_manager)
 ):
-    if current_user.role != UserRole.MANAGER:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only managers can view team members"
-        )
+    db = get_database()
     
     team_members = await db.users.find({
         "manager_id": current_user.employee_id,
-        "role": UserRole.EMPLOYEE,
+        "role": EMPLOYEE_ROLE,
         "is_active": True
-    }).to_list(None)
+    }, {"password": 0}).to_list(None)
     
-    return [UserResponse(**member) for member in team_members]
+    return [
+        UserResponse.model_construct(**{**member, "role": UserRole.EMPLOYEE})
+        for member in team_members
+    ]
 
 @router.get("/manager", response_model=List[ManagerResponse])
 async def get_managers(
-    request: Request,
-    db = Depends(get_database)
+    request: Request
 ):
-    cursor = db.users.find({"role": UserRole.MANAGER})
+    db = get_database()
+    
+    cursor = db.users.find(
+        {"role": MANAGER_ROLE},
+        {"full_name": 1, "employee_id": 1, "_id": 0}
+    )
     managers = await cursor.to_list(length=None)
 
     if not managers:
@@ -137,15 +157,10 @@ async def get_managers(
             detail="No managers found"
         )
     
-    response = []
-    for manager in managers:
-        item = {
-            "label": manager["full_name"],
-            "value": manager["employee_id"]
-        }
-        response.append(item)
-    
-    return response
+    return [
+        {"label": manager["full_name"], "value": manager["employee_id"]}
+        for manager in managers
+    ]
 
 
 @router.get("/check-auth")
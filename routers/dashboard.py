@@ -1,97 +1,138 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, status, Request, Response
 from typing import Dict
 from database import get_database
 from models import (
-    UserResponse, UserRole, ManagerDashboard, EmployeeDashboard,
-    TeamMemberStats, FeedbackResponse
+    UserResponse, UserRole, MANAGER_ROLE, EMPLOYEE_ROLE, ManagerDashboard, EmployeeDashboard,
+    TeamMemberStats, FeedbackResponse, normalize_sentiment
 )
-from auth_middleware import get_current_user
-from datetime import datetime, timedelta
+from auth_middleware import get_current_user, role_required
+from routers.feedback import normalize_feedback_data
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import time
 
 router = APIRouter()
 
-def normalize_sentiment(sentiment: str) -> str:
-    """Normalize sentiment values to lowercase standard format"""
-    if not sentiment:
-        return "neutral"
-    
-    sentiment_lower = sentiment.lower()
-    if sentiment_lower in ["positive", "pos"]:
-        return "positive"
-    elif sentiment_lower in ["negative", "neg"]:
-        return "negative"
-    else:
-        return "neutral"
+require_manager = role_required(UserRole.MANAGER, "Only managers can access this dashboard")
+require_employee = role_required(UserRole.EMPLOYEE, "Only employees can access this dashboard")
 
-def normalize_feedback_data(feedback_dict: dict) -> dict:
-    """Normalize feedback data for Pydantic model creation"""
-    normalized = feedback_dict.copy()
-    
-    if "overall_sentiment" in normalized:
-        normalized["overall_sentiment"] = normalize_sentiment(normalized["overall_sentiment"])
+THIRTY_DAYS = 30 * 24 * 3600
+
+async def get_feedback_version(db, match: dict) -> dict:
+    """Cheap change marker for a user's feedback: row count plus latest write timestamps"""
+    versions = await db.feedback.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "created_at": {"$max": "$created_at"},
+            "updated_at": {"$max": "$updated_at"},
+            "acknowledged_at": {"$max": "$acknowledged_at"}
+        }}
+    ]).to_list(1)
+    return versions[0] if versions else {}
+
+def make_etag(*parts) -> str:
+    return '"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check the request's If-None-Match header against an ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
     
-    return normalized
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
 
 @router.get("/manager", response_model=ManagerDashboard)
 async def get_manager_dashboard(
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    response: Response,
+    current_user: UserResponse = Depends(require_manager)
 ):
-    if current_user.role != UserRole.MANAGER:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only managers can access this dashboard"
-        )
+    db = get_database()
+    
+    team_members, feedback_version, active_forms_count = await asyncio.gather(
+        db.users.find({
+            "manager_id": current_user.employee_id,
+            "role": EMPLOYEE_ROLE,
+            "is_active": True
+        }, {"employee_id": 1, "full_name": 1, "_id": 0}).sort("employee_id", 1).to_list(None),
+        get_feedback_version(db, {"manager_id": current_user.employee_id}),
+        db.forms.count_documents({
+            "manager_id": current_user.employee_id,
+            "is_active": True
+        })
+    )
+    
+    etag = make_etag(current_user.employee_id, feedback_version, team_members, active_forms_count)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     
-    team_members = await db.users.find({
-        "manager_id": current_user.employee_id,
-        "role": UserRole.EMPLOYEE,
-        "is_active": True
-    }).to_list(None)
+    feedback_groups, form_submissions_count = await asyncio.gather(
+        db.feedback.aggregate([
+            {"$match": {"manager_id": current_user.employee_id}},
+            {"$group": {
+                "_id": {
+                    "employee_id": "$employee_id",
+                    "sentiment": {"$toLower": "$overall_sentiment"}
+                },
+                "count": {"$sum": 1},
+                "latest": {"$max": "$created_at"}
+            }}
+        ]).to_list(None),
+        db.feedback.count_documents({
+            "manager_id": current_user.employee_id,
+            "form_id": {"$exists": True}
+        })
+    )
     
-    all_feedback = await db.feedback.find({
-        "manager_id": current_user.employee_id
-    }).to_list(None)
+    total_feedback = 0
+    member_stats = {}
+    for group in feedback_groups:
+        total_feedback += group["count"]
+        employee_id = group["_id"].get("employee_id")
+        stats = member_stats.get(employee_id)
+        if stats is None:
+            stats = member_stats[employee_id] = {
+                "count": 0,
+                "latest": None,
+                "sentiment": {"positive": 0, "neutral": 0, "negative": 0}
+            }
+        
+        stats["sentiment"][normalize_sentiment(group["_id"].get("sentiment"))] += group["count"]
+        stats["count"] += group["count"]
+        if group["latest"] and (not stats["latest"] or group["latest"] > stats["latest"]):
+            stats["latest"] = group["latest"]
     
     team_stats = []
     sentiment_trends = {"positive": 0, "neutral": 0, "negative": 0}
     
     for member in team_members:
-        member_feedback = [f for f in all_feedback if f["employee_id"] == member["employee_id"]]
+        stats = member_stats.get(member["employee_id"])
+        if stats is None:
+            stats = {
+                "count": 0,
+                "latest": None,
+                "sentiment": {"positive": 0, "neutral": 0, "negative": 0}
+            }
         
-        sentiment_dist = {"positive": 0, "neutral": 0, "negative": 0}
-        latest_date = None
+        for sentiment, count in stats["sentiment"].items():
+            sentiment_trends[sentiment] += count
         
-        for feedback in member_feedback:
-            sentiment = normalize_sentiment(feedback.get("overall_sentiment", "neutral"))
-            sentiment_dist[sentiment] += 1
-            sentiment_trends[sentiment] += 1
-            
-            if not latest_date or feedback["created_at"] > latest_date:
-                latest_date = feedback["created_at"]
-        
-        team_stats.append(TeamMemberStats(
+        team_stats.append(TeamMemberStats.model_construct(
             employee_id=member["employee_id"],
             full_name=member["full_name"],
-            feedback_count=len(member_feedback),
-            latest_feedback_date=latest_date,
-            sentiment_distribution=sentiment_dist
+            feedback_count=stats["count"],
+            latest_feedback_date=stats["latest"],
+            sentiment_distribution=stats["sentiment"]
         ))
     
-    active_forms_count = await db.forms.count_documents({
-        "manager_id": current_user.employee_id,
-        "is_active": True
-    })
-
-    form_submissions_count = await db.feedback.count_documents({
-        "manager_id": current_user.employee_id,
-        "form_id": {"$exists": True}
-    })
-    
     return ManagerDashboard(
         team_size=len(team_members),
-        total_feedback_given=len(all_feedback),
+        total_feedback_given=total_feedback,
         team_members=team_stats,
         sentiment_trends=sentiment_trends,
         active_forms_count=active_forms_count,
@@ -101,40 +142,59 @@ async def get_manager_dashboard(
 @router.get("/employee", response_model=EmployeeDashboard)
 async def get_employee_dashboard(
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    response: Response,
+    current_user: UserResponse = Depends(require_employee)
 ):
-    if current_user.role != UserRole.EMPLOYEE:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only employees can access this dashboard"
-        )
-    
-    all_feedback = await db.feedback.find({
-        "employee_id": current_user.employee_id
-    }).sort("created_at", -1).to_list(None)
+    db = get_database()
     
-    unacknowledged_count = len([f for f in all_feedback if not f.get("is_acknowledged", False)])
-
-    sentiment_distribution = {"positive": 0, "neutral": 0, "negative": 0}
-    for feedback in all_feedback:
-        sentiment = normalize_sentiment(feedback.get("overall_sentiment", "neutral"))
-        sentiment_distribution[sentiment] += 1
-    
-    available_forms_count = 0
-    if current_user.manager_id:
-        available_forms_count = await db.forms.count_documents({
+    async def count_available_forms():
+        if not current_user.manager_id:
+            return 0
+        return await db.forms.count_documents({
             "manager_id": current_user.manager_id,
             "is_active": True
         })
     
+    feedback_version, available_forms_count = await asyncio.gather(
+        get_feedback_version(db, {"employee_id": current_user.employee_id}),
+        count_available_forms()
+    )
+    
+    etag = make_etag(current_user.employee_id, feedback_version, available_forms_count)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    sentiment_groups, unacknowledged_count, recent_feedback_docs = await asyncio.gather(
+        db.feedback.aggregate([
+            {"$match": {"employee_id": current_user.employee_id}},
+            {"$group": {
+                "_id": {"$toLower": "$overall_sentiment"},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(None),
+        db.feedback.count_documents({
+            "employee_id": current_user.employee_id,
+            "is_acknowledged": {"$ne": True}
+        }),
+        db.feedback.find({
+            "employee_id": current_user.employee_id
+        }).sort("created_at", -1).limit(5).to_list(5)
+    )
+    
+    total_feedback = 0
+    sentiment_distribution = {"positive": 0, "neutral": 0, "negative": 0}
+    for group in sentiment_groups:
+        sentiment_distribution[normalize_sentiment(group["_id"])] += group["count"]
+        total_feedback += group["count"]
+    
     recent_feedback = []
-    for feedback_dict in all_feedback[:5]:
+    for feedback_dict in recent_feedback_docs:
         normalized_feedback = normalize_feedback_data(feedback_dict)
         recent_feedback.append(FeedbackResponse(**normalized_feedback))
     
     return EmployeeDashboard(
-        total_feedback_received=len(all_feedback),
+        total_feedback_received=total_feedback,
         unacknowledged_count=unacknowledged_count,
         recent_feedback=recent_feedback,
         sentiment_distribution=sentiment_distribution,
@@ -144,26 +204,28 @@ async def get_employee_dashboard(
 @router.get("/stats")
 async def get_dashboard_stats(
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    current_user: UserResponse = Depends(get_current_user)
 ):
     """Get general stats for the current user"""
-    if current_user.role == UserRole.MANAGER:
-        team_count = await db.users.count_documents({
-            "manager_id": current_user.employee_id,
-            "role": UserRole.EMPLOYEE,
-            "is_active": True
-        })
-        
-        feedback_count = await db.feedback.count_documents({
-            "manager_id": current_user.employee_id
-        })
-        
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_feedback_count = await db.feedback.count_documents({
-            "manager_id": current_user.employee_id,
-            "created_at": {"$gte": thirty_days_ago}
-        })
+    db = get_database()
+    
+    thirty_days_ago = datetime.fromtimestamp(time.time() - THIRTY_DAYS, tz=timezone.utc).replace(tzinfo=None)
+    
+    if current_user.role == MANAGER_ROLE:
+        team_count, feedback_count, recent_feedback_count = await asyncio.gather(
+            db.users.count_documents({
+                "manager_id": current_user.employee_id,
+                "role": EMPLOYEE_ROLE,
+                "is_active": True
+            }),
+            db.feedback.count_documents({
+                "manager_id": current_user.employee_id
+            }),
+            db.feedback.count_documents({
+                "manager_id": current_user.employee_id,
+                "created_at": {"$gte": thirty_days_ago}
+            })
+        )
         
         return {
             "role": "manager",
@@ -173,20 +235,19 @@ async def get_dashboard_stats(
         }
     
     else:
-        total_feedback = await db.feedback.count_documents({
-            "employee_id": current_user.employee_id
-        })
-        
-        unacknowledged = await db.feedback.count_documents({
-            "employee_id": current_user.employee_id,
-            "is_acknowledged": False
-        })
-        
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_feedback_count = await db.feedback.count_documents({
-            "employee_id": current_user.employee_id,
-            "created_at": {"$gte": thirty_days_ago}
-        })
+        total_feedback, unacknowledged, recent_feedback_count = await asyncio.gather(
+            db.feedback.count_documents({
+                "employee_id": current_user.employee_id
+            }),
+            db.feedback.count_documents({
+                "employee_id": current_user.employee_id,
+                "is_acknowledged": False
+            }),
+            db.feedback.count_documents({
+                "employee_id": current_user.employee_id,
+                "created_at": {"$gte": thirty_days_ago}
+            })
+        )
         
         return {
             "role": "employee",
@@ -1,49 +1,176 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
-from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 from database import get_database
 from models import (
     FeedbackCreate, FeedbackUpdate, FeedbackResponse, 
-    UserResponse, UserRole
+    UserResponse, UserRole, MANAGER_ROLE, EMPLOYEE_ROLE, FeedbackAcknowledgeBatch, normalize_sentiment
 )
-from auth_middleware import get_current_user, get_current_manager
+from auth_middleware import get_current_user, get_current_manager, role_required
+from pydantic import TypeAdapter
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from cache import invalidate_forms
+import base64
+import logging
 
-def normalize_sentiment(sentiment: str) -> str:
-    """Normalize sentiment values to lowercase standard format"""
-    if not sentiment:
-        return "neutral"
-    
-    sentiment_lower = sentiment.lower()
-    if sentiment_lower in ["positive", "pos"]:
-        return "positive"
-    elif sentiment_lower in ["negative", "neg"]:
-        return "negative"
-    else:
-        return "neutral"
+logger = logging.getLogger(__name__)
 
-def normalize_feedback_data(feedback_dict: dict) -> dict:
+def normalize_feedback_data(feedback_dict: Dict[str, Any]) -> Dict[str, Any]:
     """Normalize feedback data for Pydantic model creation"""
-    normalized = feedback_dict.copy()
+    if "overall_sentiment" not in feedback_dict:
+        return feedback_dict
     
-    if "overall_sentiment" in normalized:
-        normalized["overall_sentiment"] = normalize_sentiment(normalized["overall_sentiment"])
+    sentiment = feedback_dict["overall_sentiment"]
+    normalized = normalize_sentiment(sentiment)
+    if sentiment == normalized:
+        return feedback_dict
     
-    return normalized
+    return {**feedback_dict, "overall_sentiment": normalized}
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+require_employee = role_required(UserRole.EMPLOYEE, "Only employees can acknowledge feedback")
+
+# List views skip the free-form payloads; GET /{feedback_id} returns the full document
+FEEDBACK_LIST_PROJECTION = {
+    "_id": 1,
+    "employee_id": 1,
+    "manager_id": 1,
+    "strengths": 1,
+    "areas_to_improve": 1,
+    "overall_sentiment": 1,
+    "form_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "is_acknowledged": 1,
+    "acknowledged_at": 1
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-router = APIRouter()
+# FeedbackCreate is flat, so its attributes can be copied into the insert without a serialization pass
+_FEEDBACK_FIELDS = tuple(FeedbackCreate.model_fields)
+
+FEEDBACK_ADAPTER = TypeAdapter(FeedbackResponse)
+FEEDBACK_LIST_ADAPTER = TypeAdapter(List[FeedbackResponse])
+
+# Clients sending Accept: application/x-ndjson get the full result set streamed instead of a page
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def encode_cursor(feedback: Dict[str, Any]) -> str:
+    """Encode the (created_at, _id) sort key of the last row on a page"""
+    raw = f"{feedback['created_at'].isoformat()}|{feedback['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        created_at, feedback_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(feedback_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def apply_cursor(query: dict, cursor: Optional[str]) -> dict:
+    """Restrict a feedback query to rows after the given cursor"""
+    if not cursor:
+        return query
+    
+    created_at, feedback_id = decode_cursor(cursor)
+    return {
+        **query,
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": feedback_id}}
+        ]
+    }
+
+async def fetch_feedback_page(
+    db,
+    query: dict,
+    response: Response,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None
+) -> list:
+    """Fetch one page of feedback, newest first, setting X-Next-Cursor when more rows remain"""
+    query = apply_cursor(query, cursor)
+    
+    feedback_list = await db.feedback.find(query, projection).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(feedback_list) > limit:
+        feedback_list = feedback_list[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(feedback_list[-1])
+    
+    return feedback_list
+
+def feedback_response(feedback: Dict[str, Any]) -> Response:
+    """Validate one feedback document and serialize it without FastAPI's second response_model pass"""
+    row = FEEDBACK_ADAPTER.validate_python(normalize_feedback_data(feedback))
+    return Response(
+        content=FEEDBACK_ADAPTER.dump_json(row, by_alias=True),
+        media_type="application/json"
+    )
 
-@router.post("/", response_model=FeedbackResponse)
+def feedback_page_response(feedback_list: List[Dict[str, Any]], response: Optional[Response] = None) -> Response:
+    """Serialize a page of feedback rows in one pass, keeping the X-Next-Cursor header"""
+    rows = FEEDBACK_LIST_ADAPTER.validate_python([normalize_feedback_data(feedback) for feedback in feedback_list])
+    next_cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+    return Response(
+        content=FEEDBACK_LIST_ADAPTER.dump_json(rows, by_alias=True),
+        media_type="application/json",
+        headers={"X-Next-Cursor": next_cursor} if next_cursor else None
+    )
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def stream_feedback(
+    db,
+    query: dict,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None
+) -> StreamingResponse:
+    """Stream every matching feedback row after the cursor, newest first, one JSON object per line"""
+    query = apply_cursor(query, cursor)
+    
+    async def rows():
+        async for feedback in db.feedback.find(query, projection).sort([("created_at", -1), ("_id", -1)]):
+            row = FEEDBACK_ADAPTER.validate_python(normalize_feedback_data(feedback))
+            yield FEEDBACK_ADAPTER.dump_json(row, by_alias=True) + b"\n"
+    
+    return StreamingResponse(rows(), media_type=NDJSON_MEDIA_TYPE)
+
+async def parse_feedback_id(feedback_id: str) -> ObjectId:
+    """Parse the feedback ID path parameter, rejecting malformed IDs with a 400"""
+    try:
+        return ObjectId(feedback_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid feedback ID"
+        )
+
+@router.post("/", response_model=None, responses={200: {"model": FeedbackResponse}})
 async def create_feedback(
     feedback: FeedbackCreate,
     request: Request,
-    current_user: UserResponse = Depends(get_current_manager),
-    db = Depends(get_database)
+    current_user: UserResponse = Depends(get_current_manager)
 ):
+    db = get_database()
+    
     employee = await db.users.find_one({
         "employee_id": feedback.employee_id,
         "manager_id": current_user.employee_id,
-        "role": UserRole.EMPLOYEE
+        "role": EMPLOYEE_ROLE
     })
     
     if not employee:
@@ -52,26 +179,32 @@ async def create_feedback(
             detail="Employee not found or not in your team"
         )
     
-    feedback_dict = feedback.dict()
+    feedback_dict = {field: getattr(feedback, field) for field in _FEEDBACK_FIELDS}
     feedback_dict["manager_id"] = current_user.employee_id
-    feedback_dict["created_at"] = datetime.utcnow()
+    feedback_dict["created_at"] = request.state.now
     feedback_dict["is_acknowledged"] = False
     
     result = await db.feedback.insert_one(feedback_dict)
-    created_feedback = await db.feedback.find_one({"_id": result.inserted_id})
+    created_feedback = {**feedback_dict, "_id": result.inserted_id}
+    if feedback.form_id:
+        await invalidate_forms(current_user.employee_id)
     
-    return FeedbackResponse(**normalize_feedback_data(created_feedback))
+    return feedback_response(created_feedback)
 
-@router.get("/", response_model=List[FeedbackResponse])
+@router.get("/", response_model=None, responses={200: {"model": List[FeedbackResponse]}})
 async def get_feedback(
     request: Request,
+    response: Response,
     employee_id: Optional[str] = Query(None),
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    current_user: UserResponse = Depends(get_current_user)
 ):
+    db = get_database()
+    
     query = {}
     
-    if current_user.role == UserRole.MANAGER:
+    if current_user.role == MANAGER_ROLE:
         query["manager_id"] = current_user.employee_id
         if employee_id:
             employee = await db.users.find_one({
@@ -87,152 +220,143 @@ async def get_feedback(
     else:
         query["employee_id"] = current_user.employee_id
     
-    feedback_list = await db.feedback.find(query).sort("created_at", -1).to_list(None)
-    return [FeedbackResponse(**normalize_feedback_data(feedback)) for feedback in feedback_list]
+    if wants_ndjson(request):
+        return stream_feedback(db, query, cursor, FEEDBACK_LIST_PROJECTION)
+    
+    feedback_list = await fetch_feedback_page(
+        db, query, response, limit, cursor, FEEDBACK_LIST_PROJECTION
+    )
+    return feedback_page_response(feedback_list, response)
 
-@router.get("/{feedback_id}", response_model=FeedbackResponse)
+@router.get("/{feedback_id}", response_model=None, responses={200: {"model": FeedbackResponse}})
 async def get_feedback_by_id(
-    feedback_id: str,
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    feedback_id: ObjectId = Depends(parse_feedback_id),
+    current_user: UserResponse = Depends(get_current_user)
 ):
-    if not ObjectId.is_valid(feedback_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid feedback ID"
-        )
+    db = get_database()
+    
+    query = {"_id": feedback_id}
+    if current_user.role == MANAGER_ROLE:
+        query["manager_id"] = current_user.employee_id
+    else:
+        query["employee_id"] = current_user.employee_id
     
-    feedback = await db.feedback.find_one({"_id": ObjectId(feedback_id)})
+    feedback = await db.feedback.find_one(query)
     if not feedback:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Feedback not found"
         )
     
+    return feedback_response(feedback)
 
-    if current_user.role == UserRole.MANAGER:
-        if feedback["manager_id"] != current_user.employee_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You can only view feedback you've given"
-            )
-    else:
-        if feedback["employee_id"] != current_user.employee_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You can only view your own feedback"
-            )
-    
-    return FeedbackResponse(**normalize_feedback_data(feedback))
-
-@router.put("/{feedback_id}", response_model=FeedbackResponse)
+@router.put("/{feedback_id}", response_model=None, responses={200: {"model": FeedbackResponse}})
 async def update_feedback(
-    feedback_id: str,
     feedback_update: FeedbackUpdate,
     request: Request,
-    current_user: UserResponse = Depends(get_current_manager),
-    db = Depends(get_database)
+    feedback_id: ObjectId = Depends(parse_feedback_id),
+    current_user: UserResponse = Depends(get_current_manager)
 ):
-    if not ObjectId.is_valid(feedback_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid feedback ID"
-        )
+    db = get_database()
+    
+    update_data = feedback_update.model_dump(exclude_unset=True, exclude_none=True)
+    update_data["updated_at"] = request.state.now
     
-    existing_feedback = await db.feedback.find_one({"_id": ObjectId(feedback_id)})
-    if not existing_feedback:
+    updated_feedback = await db.feedback.find_one_and_update(
+        {"_id": feedback_id, "manager_id": current_user.employee_id},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_feedback:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Feedback not found"
         )
     
-    if existing_feedback["manager_id"] != current_user.employee_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only update feedback you've given"
+    return feedback_response(updated_feedback)
+
+async def record_acknowledgement(db, owned_filter: dict, acknowledged_at: datetime):
+    """Background write for acknowledge_feedback; failures are reported since no client is waiting"""
+    try:
+        await db.feedback.update_one(
+            owned_filter,
+            {
+                "$set": {
+                    "is_acknowledged": True,
+                    "acknowledged_at": acknowledged_at
+                }
+            }
         )
+    except PyMongoError:
+        logger.exception("Failed to record acknowledgement for feedback %s", owned_filter["_id"])
+
+@router.post("/{feedback_id}/acknowledge", status_code=status.HTTP_202_ACCEPTED)
+async def acknowledge_feedback(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    feedback_id: ObjectId = Depends(parse_feedback_id),
+    current_user: UserResponse = Depends(require_employee)
+):
+    """Queue the acknowledgement; the ownership filter makes it a no-op for other employees' feedback"""
+    db = get_database()
     
-    update_data = {k: v for k, v in feedback_update.dict().items() if v is not None}
-    update_data["updated_at"] = datetime.utcnow()
-    
-    await db.feedback.update_one(
-        {"_id": ObjectId(feedback_id)},
-        {"$set": update_data}
-    )
+    owned_filter = {"_id": feedback_id, "employee_id": current_user.employee_id}
+    background_tasks.add_task(record_acknowledgement, db, owned_filter, request.state.now)
     
-    updated_feedback = await db.feedback.find_one({"_id": ObjectId(feedback_id)})
-    return FeedbackResponse(**normalize_feedback_data(updated_feedback))
+    return {"message": "Feedback acknowledgement queued"}
 
-@router.post("/{feedback_id}/acknowledge")
-async def acknowledge_feedback(
-    feedback_id: str,
+@router.post("/acknowledge_batch")
+async def acknowledge_feedback_batch(
+    batch: FeedbackAcknowledgeBatch,
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    current_user: UserResponse = Depends(require_employee)
 ):
-    if current_user.role != UserRole.EMPLOYEE:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only employees can acknowledge feedback"
-        )
+    """Acknowledge several of the current employee's feedback entries in one write"""
+    db = get_database()
     
-    if not ObjectId.is_valid(feedback_id):
+    try:
+        feedback_ids = [ObjectId(feedback_id) for feedback_id in batch.ids]
+    except (InvalidId, TypeError):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid feedback ID"
         )
     
-    feedback = await db.feedback.find_one({"_id": ObjectId(feedback_id)})
-    if not feedback:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Feedback not found"
-        )
-    
-    if feedback["employee_id"] != current_user.employee_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only acknowledge your own feedback"
-        )
-    
-    await db.feedback.update_one(
-        {"_id": ObjectId(feedback_id)},
+    result = await db.feedback.update_many(
+        {"_id": {"$in": feedback_ids}, "employee_id": current_user.employee_id},
         {
             "$set": {
                 "is_acknowledged": True,
-                "acknowledged_at": datetime.utcnow()
+                "acknowledged_at": request.state.now
             }
         }
     )
     
-    return {"message": "Feedback acknowledged successfully"}
+    return {
+        "message": "Feedback acknowledged successfully",
+        "acknowledged_count": result.matched_count
+    }
 
 @router.delete("/{feedback_id}")
 async def delete_feedback(
-    feedback_id: str,
     request: Request,
-    current_user: UserResponse = Depends(get_current_manager),
-    db = Depends(get_database)
+    feedback_id: ObjectId = Depends(parse_feedback_id),
+    current_user: UserResponse = Depends(get_current_manager)
 ):
-    if not ObjectId.is_valid(feedback_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid feedback ID"
-        )
+    db = get_database()
     
-    feedback = await db.feedback.find_one({"_id": ObjectId(feedback_id)})
-    if not feedback:
+    deleted = await db.feedback.find_one_and_delete(
+        {"_id": feedback_id, "manager_id": current_user.employee_id},
+        projection={"form_id": 1}
+    )
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Feedback not found"
         )
     
-    if feedback["manager_id"] != current_user.employee_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only delete feedback you've given"
-        )
+    if deleted.get("form_id"):
+        await invalidate_forms(current_user.employee_id)
     
-    await db.feedback.delete_one({"_id": ObjectId(feedback_id)})
     return {"message": "Feedback deleted successfully"}
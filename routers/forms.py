@@ -1,44 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from typing import List, Dict, Any
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from database import get_database
 from models import (
     FeedbackFormCreate, FeedbackFormUpdate, FeedbackFormResponse,
-    UserResponse, UserRole, FeedbackCreate, FeedbackResponse
+    UserResponse, UserRole, MANAGER_ROLE, EMPLOYEE_ROLE, FeedbackCreate, FeedbackResponse, MAX_BATCH_SIZE
 )
 from auth_middleware import get_current_manager, get_current_user
+from routers.feedback import (
+    fetch_feedback_page, feedback_response, feedback_page_response, stream_feedback, wants_ndjson,
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from cache import cache_get, cache_set, forms_list_key, form_key, invalidate_forms
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+import asyncio
+
+router = APIRouter(default_response_class=ORJSONResponse)
 
-router = APIRouter()
+def dump_form(form_doc: dict) -> dict:
+    """Validate a stored form once and dump it to JSON-ready data"""
+    return FeedbackFormResponse(**form_doc).model_dump(mode="json", by_alias=True)
 
-@router.post("/", response_model=FeedbackFormResponse)
+async def parse_form_id(form_id: str) -> ObjectId:
+    """Parse the form ID path parameter, rejecting malformed IDs with a 400"""
+    try:
+        return ObjectId(form_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid form ID"
+        )
+
+@router.post("/", response_model=None, responses={200: {"model": FeedbackFormResponse}})
 async def create_feedback_form(
     form: FeedbackFormCreate,
     request: Request,
-    current_user: UserResponse = Depends(get_current_manager),
-    db = Depends(get_database)
+    current_user: UserResponse = Depends(get_current_manager)
 ):
     """Create a custom feedback form template"""
-    form_dict = form.dict()
+    db = get_database()
+    
+    form_dict = form.model_dump()
     form_dict["manager_id"] = current_user.employee_id
-    form_dict["created_at"] = datetime.utcnow()
+    form_dict["created_at"] = request.state.now
     
     result = await db.forms.insert_one(form_dict)
-    created_form = await db.forms.find_one({"_id": result.inserted_id})
+    created_form = {**form_dict, "_id": result.inserted_id}
+    await invalidate_forms(current_user.employee_id)
     
-    return FeedbackFormResponse(**created_form)
+    return ORJSONResponse(content=dump_form(created_form))
 
-@router.get("/", response_model=List[FeedbackFormResponse])
+@router.get("/", response_model=None, responses={200: {"model": List[FeedbackFormResponse]}})
 async def get_feedback_forms(
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    current_user: UserResponse = Depends(get_current_user)
 ):
     """Get all feedback forms - managers see their forms, employees see their manager's forms"""
-    if current_user.role == UserRole.MANAGER:
-        forms = await db.forms.find({
-            "manager_id": current_user.employee_id
-        }).sort("created_at", -1).to_list(None)
+    db = get_database()
+    
+    if current_user.role == MANAGER_ROLE:
+        cache_key = forms_list_key(current_user.employee_id, active_only=False)
+        query = {"manager_id": current_user.employee_id}
     else:
         if not current_user.manager_id:
             raise HTTPException(
@@ -46,49 +71,56 @@ async def get_feedback_forms(
                 detail="Employee has no assigned manager"
             )
         
-        forms = await db.forms.find({
-            "manager_id": current_user.manager_id,
-            "is_active": True
-        }).sort("created_at", -1).to_list(None)
+        cache_key = forms_list_key(current_user.manager_id, active_only=True)
+        query = {"manager_id": current_user.manager_id, "is_active": True}
+    
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(content=cached)
+    
+    forms = await db.forms.find(query).sort("created_at", -1).to_list(None)
+    
+    form_ids = [str(form["_id"]) for form in forms]
+    submission_counts = await db.feedback.aggregate([
+        {"$match": {"form_id": {"$in": form_ids}}},
+        {"$group": {"_id": "$form_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    count_map = {count["_id"]: count["count"] for count in submission_counts}
     
     forms_with_submissions = []
-    for form in forms:
-        form_id = str(form["_id"])
-        
-        submission_count = await db.feedback.count_documents({
-            "form_id": form_id
-        })
-        
+    for form_id, form in zip(form_ids, forms):
         form_with_count = form.copy()
-        form_with_count["submission_count"] = submission_count
+        form_with_count["submission_count"] = count_map.get(form_id, 0)
         
-        forms_with_submissions.append(FeedbackFormResponse(**form_with_count))
+        forms_with_submissions.append(dump_form(form_with_count))
     
-    return forms_with_submissions
+    await cache_set(cache_key, forms_with_submissions)
+    return ORJSONResponse(content=forms_with_submissions)
 
 
-@router.get("/{form_id}", response_model=FeedbackFormResponse)
+@router.get("/{form_id}", response_model=None, responses={200: {"model": FeedbackFormResponse}})
 async def get_feedback_form(
-    form_id: str,
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    form_id: ObjectId = Depends(parse_form_id),
+    current_user: UserResponse = Depends(get_current_user)
 ):
     """Get a specific feedback form"""
-    if not ObjectId.is_valid(form_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid form ID"
-        )
+    db = get_database()
     
-    form = await db.forms.find_one({"_id": ObjectId(form_id)})
-    if not form:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Form not found"
-        )
+    cache_key = form_key(form_id)
+    form = await cache_get(cache_key)
+    if form is None:
+        form_doc = await db.forms.find_one({"_id": form_id})
+        if not form_doc:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Form not found"
+            )
+        
+        form = dump_form(form_doc)
+        await cache_set(cache_key, form)
     
-    if current_user.role == UserRole.MANAGER:
+    if current_user.role == MANAGER_ROLE:
         if form["manager_id"] != current_user.employee_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -107,62 +139,45 @@ async def get_feedback_form(
                 detail="Form not found or not active"
             )
     
-    return FeedbackFormResponse(**form)
+    return ORJSONResponse(content=form)
 
-@router.put("/{form_id}", response_model=FeedbackFormResponse)
+@router.put("/{form_id}", response_model=None, responses={200: {"model": FeedbackFormResponse}})
 async def update_feedback_form(
-    form_id: str,
     form_update: FeedbackFormUpdate,
     request: Request,
-    current_user: UserResponse = Depends(get_current_manager),
-    db = Depends(get_database)
+    form_id: ObjectId = Depends(parse_form_id),
+    current_user: UserResponse = Depends(get_current_manager)
 ):
     """Update a feedback form"""
-    if not ObjectId.is_valid(form_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid form ID"
-        )
+    db = get_database()
+    
+    update_data = form_update.model_dump(exclude_unset=True, exclude_none=True)
+    update_data["updated_at"] = request.state.now
     
-    existing_form = await db.forms.find_one({"_id": ObjectId(form_id)})
-    if not existing_form:
+    updated_form = await db.forms.find_one_and_update(
+        {"_id": form_id, "manager_id": current_user.employee_id},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_form:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Form not found"
         )
-
-    if existing_form["manager_id"] != current_user.employee_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only update forms you've created"
-        )
-    
-    update_data = {k: v for k, v in form_update.dict().items() if v is not None}
-    update_data["updated_at"] = datetime.utcnow()
     
-    await db.forms.update_one(
-        {"_id": ObjectId(form_id)},
-        {"$set": update_data}
-    )
-    
-    updated_form = await db.forms.find_one({"_id": ObjectId(form_id)})
-    return FeedbackFormResponse(**updated_form)
+    await invalidate_forms(current_user.employee_id, form_id)
+    return ORJSONResponse(content=dump_form(updated_form))
 
 @router.delete("/{form_id}")
 async def delete_feedback_form(
-    form_id: str,
     request: Request,
-    current_user: UserResponse = Depends(get_current_manager),
-    db = Depends(get_database)
+    form_id: ObjectId = Depends(parse_form_id),
+    current_user: UserResponse = Depends(get_current_manager)
 ):
     """Delete a feedback form"""
-    if not ObjectId.is_valid(form_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid form ID"
-        )
+    db = get_database()
     
-    form = await db.forms.find_one({"_id": ObjectId(form_id)})
+    form = await db.forms.find_one({"_id": form_id})
     if not form:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -175,17 +190,19 @@ async def delete_feedback_form(
             detail="You can only delete forms you've created"
         )
     
-    await db.forms.delete_one({"_id": ObjectId(form_id)})
+    await db.forms.delete_one({"_id": form_id})
+    await invalidate_forms(current_user.employee_id, form_id)
     return {"message": "Form deleted successfully"}
 
-@router.get("/active/list", response_model=List[FeedbackFormResponse])
+@router.get("/active/list", response_model=None, responses={200: {"model": List[FeedbackFormResponse]}})
 async def get_active_forms(
     request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
+    current_user: UserResponse = Depends(get_current_user)
 ):
     """Get all active feedback forms"""
-    if current_user.role == UserRole.MANAGER:
+    db = get_database()
+    
+    if current_user.role == MANAGER_ROLE:
         forms = await db.forms.find({
             "manager_id": current_user.employee_id,
             "is_active": True
@@ -202,24 +219,10 @@ async def get_active_forms(
             "is_active": True
         }).sort("created_at", -1).to_list(None)
     
-    return [FeedbackFormResponse(**form) for form in forms]
+    return ORJSONResponse(content=[dump_form(form) for form in forms])
 
-@router.post("/{form_id}/submit", response_model=FeedbackResponse)
-async def submit_feedback_form(
-    form_id: str,
-    form_data: Dict[str, Any],
-    request: Request,
-    current_user: UserResponse = Depends(get_current_user),
-    db = Depends(get_database)
-):
-    """Submit feedback using a specific form (employees can submit, managers can submit for their team members)"""
-    if not ObjectId.is_valid(form_id):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid form ID"
-        )
-    
-    form = await db.forms.find_one({"_id": ObjectId(form_id)})
+def check_form_submittable(form: Optional[dict], current_user: UserResponse):
+    """Raise unless the form exists, is active and may be used by the current user"""
     if not form:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -232,88 +235,188 @@ async def submit_feedback_form(
             detail="Form is not active"
         )
     
-    if current_user.role == UserRole.EMPLOYEE:
+    if current_user.role == EMPLOYEE_ROLE:
         if form["manager_id"] != current_user.manager_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can only use forms created by your manager"
             )
-        
-        employee_id = current_user.employee_id
-        manager_id = current_user.manager_id
-        
-    else:  # Manager
+    else:
         if form["manager_id"] != current_user.employee_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can only use forms you've created"
             )
-        
-        target_employee_id = form_data.get("target_employee_id")
+
+def get_form_text(form_data: Dict[str, Any], field: str, default: str, nullable: bool = False) -> Optional[str]:
+    """Read a text field of the feedback document from free-form submission data"""
+    value = form_data.get(field, default)
+    if value is None and nullable:
+        return None
+    
+    if not isinstance(value, str):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{field} must be a string"
+        )
+    return value
+
+def build_form_feedback(form: dict, form_data: Dict[str, Any], current_user: UserResponse, now: datetime) -> dict:
+    """Build the feedback document for one form submission"""
+    if current_user.role == EMPLOYEE_ROLE:
+        employee_id = current_user.employee_id
+        manager_id = current_user.manager_id
+    else:
+        employee_id = form_data["target_employee_id"]
+        manager_id = current_user.employee_id
+        form_data = {k: v for k, v in form_data.items() if k != "target_employee_id"}
+    
+    return {
+        "employee_id": employee_id,
+        "manager_id": manager_id,
+        "strengths": get_form_text(form_data, "strengths", "Submitted via custom form"),
+        "areas_to_improve": get_form_text(form_data, "areas_to_improve", "Submitted via custom form"),
+        "overall_sentiment": get_form_text(form_data, "overall_sentiment", "neutral", nullable=True),
+        "additional_notes": get_form_text(form_data, "additional_notes", f"Submitted using form: {form['title']}", nullable=True),
+        "form_data": form_data,
+        "form_id": str(form["_id"]),
+        "created_at": now,
+        "is_acknowledged": False
+    }
+
+def get_target_employee_id(form_data: Dict[str, Any]) -> Optional[str]:
+    """Return the submission's target_employee_id, rejecting values that are not strings"""
+    target_employee_id = form_data.get("target_employee_id")
+    if target_employee_id is not None and not isinstance(target_employee_id, str):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="target_employee_id must be a string"
+        )
+    return target_employee_id
+
+def require_target_employee_ids(submissions: List[Dict[str, Any]]) -> set:
+    """Return the target employee ids of manager submissions, requiring one on every entry"""
+    target_employee_ids = {get_target_employee_id(form_data) for form_data in submissions}
+    if None in target_employee_ids or "" in target_employee_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="target_employee_id is required when manager submits feedback"
+        )
+    return target_employee_ids
+
+@router.post("/{form_id}/submit", response_model=None, responses={200: {"model": FeedbackResponse}})
+async def submit_feedback_form(
+    form_data: Dict[str, Any],
+    request: Request,
+    form_id: ObjectId = Depends(parse_form_id),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Submit feedback using a specific form (employees can submit, managers can submit for their team members)"""
+    db = get_database()
+    
+    target_employee_id = None
+    if current_user.role != EMPLOYEE_ROLE:
+        target_employee_id = get_target_employee_id(form_data)
+    
+    async def find_target_employee():
         if not target_employee_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="target_employee_id is required when manager submits feedback"
-            )
-        
-        employee = await db.users.find_one({
+            return None
+        return await db.users.find_one({
             "employee_id": target_employee_id,
             "manager_id": current_user.employee_id,
-            "role": UserRole.EMPLOYEE
+            "role": EMPLOYEE_ROLE
         })
+    
+    form, employee = await asyncio.gather(
+        db.forms.find_one({"_id": form_id}),
+        find_target_employee()
+    )
+    check_form_submittable(form, current_user)
+    
+    if current_user.role != EMPLOYEE_ROLE:
+        require_target_employee_ids([form_data])
         
         if not employee:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Employee not found or not in your team"
             )
-        
-        employee_id = target_employee_id
-        manager_id = current_user.employee_id
-        
-        form_data = {k: v for k, v in form_data.items() if k != "target_employee_id"}
-
-
-    strengths = form_data.get("strengths", "Submitted via custom form")
-    areas_to_improve = form_data.get("areas_to_improve", "Submitted via custom form")
-    overall_sentiment = form_data.get("overall_sentiment", "neutral")
-    additional_notes = form_data.get("additional_notes", f"Submitted using form: {form['title']}")
     
-
-    feedback_dict = {
-        "employee_id": employee_id,
-        "manager_id": manager_id,
-        "strengths": strengths,
-        "areas_to_improve": areas_to_improve,
-        "overall_sentiment": overall_sentiment,
-        "additional_notes": additional_notes,
-        "form_data": form_data, 
-        "form_id": str(form["_id"]),  
-        "created_at": datetime.utcnow(),
-        "is_acknowledged": False
-    }
+    feedback_dict = build_form_feedback(form, form_data, current_user, request.state.now)
     
     result = await db.feedback.insert_one(feedback_dict)
-    created_feedback = await db.feedback.find_one({"_id": result.inserted_id})
+    created_feedback = {**feedback_dict, "_id": result.inserted_id}
+    await invalidate_forms(form["manager_id"])
     
-    return FeedbackResponse(**created_feedback)
-
+    return feedback_response(created_feedback)
 
-@router.get("/{form_id}/submissions", response_model=List[FeedbackResponse])
-async def get_form_submissions(
-    form_id: str,
+@router.post("/{form_id}/submit_batch", response_model=None, responses={200: {"model": List[FeedbackResponse]}})
+async def submit_feedback_form_batch(
     request: Request,
-    current_user: UserResponse = Depends(get_current_manager),
-    db = Depends(get_database)
+    submissions: List[Dict[str, Any]] = Body(max_length=MAX_BATCH_SIZE),
+    form_id: ObjectId = Depends(parse_form_id),
+    current_user: UserResponse = Depends(get_current_user)
 ):
-    """Get all feedback submissions for a specific form (managers only)"""
-    if not ObjectId.is_valid(form_id):
+    """Submit several entries using the same form in a single insert"""
+    db = get_database()
+    
+    if not submissions:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid form ID"
+            detail="No submissions provided"
         )
     
-    form = await db.forms.find_one({"_id": ObjectId(form_id)})
+    target_employee_ids = set()
+    if current_user.role != EMPLOYEE_ROLE:
+        target_employee_ids = {get_target_employee_id(form_data) for form_data in submissions} - {None, ""}
+    
+    async def find_target_employees():
+        if not target_employee_ids:
+            return []
+        return await db.users.find({
+            "employee_id": {"$in": list(target_employee_ids)},
+            "manager_id": current_user.employee_id,
+            "role": EMPLOYEE_ROLE
+        }, {"employee_id": 1, "_id": 0}).to_list(None)
+    
+    form, employees = await asyncio.gather(
+        db.forms.find_one({"_id": form_id}),
+        find_target_employees()
+    )
+    check_form_submittable(form, current_user)
+    
+    if current_user.role != EMPLOYEE_ROLE:
+        require_target_employee_ids(submissions)
+        
+        if target_employee_ids - {employee["employee_id"] for employee in employees}:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Employee not found or not in your team"
+            )
+    
+    feedback_dicts = [build_form_feedback(form, form_data, current_user, request.state.now) for form_data in submissions]
+    
+    result = await db.feedback.insert_many(feedback_dicts)
+    await invalidate_forms(form["manager_id"])
+    
+    return feedback_page_response([
+        {**feedback_dict, "_id": inserted_id}
+        for feedback_dict, inserted_id in zip(feedback_dicts, result.inserted_ids)
+    ])
+
+@router.get("/{form_id}/submissions", response_model=None, responses={200: {"model": List[FeedbackResponse]}})
+async def get_form_submissions(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    form_id: ObjectId = Depends(parse_form_id),
+    current_user: UserResponse = Depends(get_current_manager)
+):
+    """Get all feedback submissions for a specific form (managers only)"""
+    db = get_database()
+    
+    form = await db.forms.find_one({"_id": form_id})
     if not form:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -326,8 +429,11 @@ async def get_form_submissions(
             detail="You can only view submissions for forms you've created"
         )
     
-    submissions = await db.feedback.find({
-        "form_id": form_id
-    }).sort("created_at", -1).to_list(None)
+    if wants_ndjson(request):
+        return stream_feedback(db, {"form_id": str(form_id)}, cursor)
+    
+    submissions = await fetch_feedback_page(
+        db, {"form_id": str(form_id)}, response, limit, cursor
+    )
     
-    return [FeedbackResponse(**submission) for submission in submissions]
+    return feedback_page_response(submissions, response)